@@ -0,0 +1,19 @@
+"""
+Gunicorn configuration - uvicorn workers forked from a master that has already loaded the models
+Run from the app/ directory:  gunicorn main:app
+"""
+
+import os
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8000')}"
+workers = int(os.getenv("API_WORKERS", str(min(4, os.cpu_count() or 1))))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+
+# Import main in the master so the models can be loaded once before forking
+preload_app = True
+
+def when_ready(server):
+    """Load models in the master; workers share the pages copy-on-write and skip their own load"""
+    import main
+    main.load_models()
@@ -3,29 +3,36 @@ ITSM AI-Driven Intelligent Ticketing API
 FastAPI application for hackathon demo
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+import asyncio
+import json
+import orjson
 import time
-from datetime import datetime
+from anyio import CapacityLimiter, to_thread
 
 # Import utilities
 import sys
 from pathlib import Path
+from types import MappingProxyType
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.model_loader import ModelLoader
-from utils.predictor import TicketPredictor
-from utils.rag_engine import RAGEngine
-from config.settings import API_TITLE, API_VERSION, API_DESCRIPTION
+# Model utilities (torch, transformers, scikit-learn) are imported in load_models(), not at module import
+from config.settings import (
+    API_TITLE, API_VERSION, API_DESCRIPTION, EMBEDDING_CACHE_PATH, PREDICTION_THREADS, KB_PATH, HISTORY_PATH,
+    API_HOST, API_PORT, API_WORKERS, TORCH_THREADS, ENCODER_THREADS
+)
 
 # Initialize FastAPI
 app = FastAPI(
     title=API_TITLE,
     version=API_VERSION,
-    description=API_DESCRIPTION
+    description=API_DESCRIPTION,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -37,30 +44,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables for models
-models = None
-predictor = None
-rag_engine = None
+# Loaded models live on app.state (set by load_models)
+app.state.models = None
+app.state.predictor = None
+app.state.rag_engine = None
 
-@app.on_event("startup")
-async def startup_event():
-    """Load models on startup"""
-    global models, predictor, rag_engine
+# Thread limiters for the prediction stages (created per process in startup_event)
+app.state.cpu_limiter = None
+
+# Fixed audit-trail wording, shared by every response
+_AUDIT_STATIC = MappingProxyType({
+    "resolver_reasoning_mapping": "Category-based deterministic routing",
+    "duplicate_method": "Sentence-BERT cosine similarity",
+    "kb_method": "Embedding-based semantic search"
+})
+
+# "/" only varies with whether the models are loaded, so both bodies are serialized once
+_ROOT_BODIES = {
+    loaded: orjson.dumps({
+        "status": "healthy",
+        "api": API_TITLE,
+        "version": API_VERSION,
+        "models_loaded": loaded,
+        "endpoints": ["/predict", "/health"]
+    })
+    for loaded in (False, True)
+}
+
+# (second, formatted prefix) of the last timestamp, reused while the second is unchanged
+_iso_cache = (None, "")
+
+def _fast_iso(ns):
+    """Local ISO-8601 timestamp from time.time_ns(), in the same format as datetime.isoformat()"""
+    global _iso_cache
+    seconds, remainder = divmod(ns, 1_000_000_000)
+    cached_second, prefix = _iso_cache
+    if cached_second != seconds:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds))
+        _iso_cache = (seconds, prefix)
+    return f"{prefix}.{remainder // 1000:06d}"
+
+def load_models():
+    """Load models and build the predictor / RAG engine (no-op if already loaded in this process)"""
+    # Under gunicorn --preload this already ran in the master, and forked workers inherit the result
+    if app.state.predictor is not None:
+        return
     
     print("🚀 Starting ITSM AI API...")
+    
+    # Cap torch threads before any model loads: concurrent requests × cpu_count intra-op threads oversubscribe the CPU
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
+    torch.set_num_interop_threads(1)
+    
+    from utils.model_loader import ModelLoader
+    from utils.predictor import TicketPredictor
+    from utils.rag_engine import RAGEngine
+    from utils.embedding_cache import EmbeddingCache
+    
     print("📥 Loading models from HuggingFace...")
     
     # Load models
     loader = ModelLoader()
     models = loader.download_models()
     
-    # Initialize predictor and RAG engine
-    predictor = TicketPredictor(models)
-    rag_engine = RAGEngine(models['sentence_bert'])
+    # Initialize predictor and RAG engine (sharing one embedding cache, which also throttles encoder calls:
+    # an encode already spreads over several intra-op threads, so then run one at a time)
+    embedding_cache = EmbeddingCache(
+        EMBEDDING_CACHE_PATH,
+        max_concurrent_encodes=1 if ENCODER_THREADS > 1 else PREDICTION_THREADS
+    )
+    predictor = TicketPredictor(models, embedding_cache)
+    rag_engine = RAGEngine(models['sentence_bert'], embedding_cache, models['tfidf_vectorizer'])
+    
+    # Embed the startup-configured knowledge base once, if one is provided
+    if Path(KB_PATH).exists():
+        with open(KB_PATH, encoding="utf-8") as f:
+            knowledge_base = json.load(f)
+        rag_engine.load_knowledge_base(knowledge_base)
+        print(f"📚 Loaded {len(knowledge_base)} KB articles from {KB_PATH}")
+    
+    # Same for historical tickets used by duplicate detection
+    if Path(HISTORY_PATH).exists():
+        with open(HISTORY_PATH, encoding="utf-8") as f:
+            historical_tickets = json.load(f)
+        predictor.load_history(historical_tickets)
+        print(f"🗂️ Loaded {len(historical_tickets)} historical tickets from {HISTORY_PATH}")
     
+    app.state.models = models
+    app.state.predictor = predictor
+    app.state.rag_engine = rag_engine
     print("✅ All models loaded successfully!")
+
+@app.on_event("startup")
+async def startup_event():
+    """Load models on startup"""
+    load_models()
+    
+    # Bound worker threads so bursts queue instead of oversubscribing the cores (NumPy/torch release the GIL)
+    app.state.cpu_limiter = CapacityLimiter(PREDICTION_THREADS)
     print("🎯 API ready to receive requests")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the embedding cache's SQLite connection"""
+    if app.state.predictor is not None:
+        app.state.predictor.embedding_cache.close()
+
 # Request/Response Models
 class TicketRequest(BaseModel):
     user: str = Field(..., description="User who created the ticket")
@@ -80,26 +170,23 @@ class TicketResponse(BaseModel):
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "api": API_TITLE,
-        "version": API_VERSION,
-        "models_loaded": models is not None,
-        "endpoints": ["/predict", "/health"]
-    }
+    return Response(content=_ROOT_BODIES[app.state.models is not None], media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check with model status"""
     return {
         "status": "healthy",
-        "models_loaded": models is not None,
-        "predictor_ready": predictor is not None,
-        "rag_engine_ready": rag_engine is not None,
-        "timestamp": datetime.now().isoformat()
+        "models_loaded": app.state.models is not None,
+        "predictor_ready": app.state.predictor is not None,
+        "rag_engine_ready": app.state.rag_engine is not None,
+        "prediction_cache": app.state.predictor.cache_info() if app.state.predictor else None,
+        "timestamp": _fast_iso(time.time_ns())
     }
 
-@app.post("/predict", response_model=TicketResponse)
+# The response is assembled from trusted model output, so it is serialized directly instead of being
+# re-validated against TicketResponse (kept as the documented schema)
+@app.post("/predict", responses={200: {"model": TicketResponse}})
 async def predict_ticket(request: TicketRequest):
     """
     🎯 **Main Prediction Endpoint**
@@ -115,73 +202,113 @@ async def predict_ticket(request: TicketRequest):
     - Detailed audit trail (reasoning + confidence)
     """
     
+    models = app.state.models
+    predictor = app.state.predictor
+    rag_engine = app.state.rag_engine
+    
     if not models or not predictor or not rag_engine:
         raise HTTPException(status_code=503, detail="Models not loaded yet. Please wait...")
     
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
+    
+    # Every background stage, so a failure anywhere can cancel and reap the rest (see finally)
+    tasks = []
+    
+    def spawn(awaitable):
+        task = asyncio.ensure_future(awaitable)
+        tasks.append(task)
+        return task
     
     try:
         # Generate ticket ID
-        ticket_id = f"TICKET-{int(time.time() * 1000)}"
+        ticket_id = f"TICKET-{time.time_ns() // 1_000_000}"
         
         # Handle empty title/description
         title = request.title.strip() if request.title else "No title provided"
         description = request.description.strip() if request.description else "No description provided"
         
-        # 1. PREDICT CATEGORY (with confidence)
-        category_result = predictor.predict_category(title, description)
+        # Ticket text built once: raw for Sentence-BERT, normalized (lowercased) as the prediction-cache key
+        combined_text = f"{title} {description}"
+        normalized_text = predictor.normalize_text(title, description, combined_text)
         
-        # 2. PREDICT PRIORITY (Impact × Urgency)
-        priority_result = predictor.predict_priority(title, description, category_result['category'])
+        cpu_limiter = app.state.cpu_limiter
         
-        # 3. PREDICT RESOLVER GROUP (ML-based routing)
-        resolver_result = predictor.predict_resolver(
-            title, 
-            description,
-            category_result['category'],
-            priority_result['impact'],
-            priority_result['urgency']
-        )
+        def run_cpu(func, *args):
+            return to_thread.run_sync(func, *args, limiter=cpu_limiter)
         
-        # 4. FIND DUPLICATES (Sentence-BERT similarity)
-        duplicate_result = predictor.find_duplicates(
-            title, 
-            description, 
-            request.historical_tickets
-        )
+        # Sentence-BERT query vector, encoded once and shared by duplicate detection and KB search
+        query_future = None
+        if (request.historical_tickets or predictor.default_history
+                or request.knowledge_base or rag_engine.default_knowledge_base):
+            query_future = spawn(run_cpu(rag_engine.encode_query, title, description, combined_text))
         
-        # 5. SEARCH KNOWLEDGE BASE (RAG)
-        kb_result = rag_engine.search_knowledge_base(
-            title,
-            description,
-            category_result['category'],
-            request.knowledge_base
-        )
+        async def run_with_query_vec(func, *args):
+            query_vec = await query_future if query_future is not None else None
+            return await run_cpu(func, *args, query_vec, combined_text)
         
-        # 6. GENERATE AUTO-RESPONSE (template + KB)
-        auto_response_result = rag_engine.generate_auto_response(
-            category_result['category'],
-            title,
-            description,
-            kb_result['kb_articles']
+        # 4. FIND DUPLICATES (Sentence-BERT similarity) - independent of category, start right away
+        duplicate_future = spawn(
+            run_with_query_vec(predictor.find_duplicates, title, description, request.historical_tickets)
         )
         
-        # 7. DETECT PATTERNS (recurring issues)
-        pattern_result = rag_engine.detect_patterns(
-            category_result['category'],
-            duplicate_result['similar_tickets']
+        # 1. PREDICT CATEGORY (with confidence) - the remaining stages depend on it
+        category_result = await run_cpu(predictor.predict_category, title, description, normalized_text)
+        category = category_result['category']
+        
+        # 2-3, 5. PRIORITY, RESOLVER and KB SEARCH run concurrently with duplicate detection
+        async def predict_priority_and_resolver():
+            # Resolver routing needs the impact/urgency from priority
+            priority = await run_cpu(
+                predictor.predict_priority,
+                title,
+                description,
+                category,
+                normalized_text,
+                category_result['matched_keywords']
+            )
+            resolver = await run_cpu(
+                predictor.predict_resolver,
+                title,
+                description,
+                category,
+                priority['impact'],
+                priority['urgency'],
+                category_result['keyword_shortcut'],
+                category_result['confidence'],
+                normalized_text,
+                # Same keyword pass as the category stage (hashable, so it can key the resolver cache)
+                tuple(category_result['keyword_matches'].items())
+            )
+            return priority, resolver
+        
+        (priority_result, resolver_result), duplicate_result, kb_result = await asyncio.gather(
+            spawn(predict_priority_and_resolver()),
+            duplicate_future,
+            # 5. SEARCH KNOWLEDGE BASE (RAG)
+            spawn(run_with_query_vec(
+                rag_engine.search_knowledge_base, title, description, category, request.knowledge_base
+            ))
         )
         
-        # 8. PROACTIVE INSIGHTS (SLA risk, recommendations)
-        insights_result = rag_engine.generate_proactive_insights(
-            category_result['category'],
-            priority_result['priority'],
-            duplicate_result['similar_tickets'],
-            kb_result['kb_articles']
+        # 6-8. AUTO-RESPONSE, PATTERNS and PROACTIVE INSIGHTS join on the stages above
+        auto_response_result, pattern_result, insights_result = await asyncio.gather(
+            spawn(run_cpu(
+                rag_engine.generate_auto_response, category, title, description, kb_result['kb_articles']
+            )),
+            spawn(run_cpu(
+                rag_engine.detect_patterns, category, duplicate_result['similar_tickets']
+            )),
+            spawn(run_cpu(
+                rag_engine.generate_proactive_insights,
+                category,
+                priority_result['priority'],
+                duplicate_result['similar_tickets'],
+                kb_result['kb_articles']
+            ))
         )
         
         # Calculate processing time
-        processing_time = (time.time() - start_time) * 1000
+        processing_time = (time.perf_counter_ns() - start_ns) / 1_000_000
         
         # Build comprehensive response
         response = {
@@ -200,7 +327,8 @@ async def predict_ticket(request: TicketRequest):
                 },
                 "resolver_group": {
                     "assigned_to": resolver_result['resolver_group'],
-                    "confidence": resolver_result['confidence']
+                    "confidence": resolver_result['confidence'],
+                    "source": resolver_result['source']
                 },
                 "duplicates": {
                     "has_duplicates": duplicate_result['has_duplicates'],
@@ -245,26 +373,44 @@ async def predict_ticket(request: TicketRequest):
                 },
                 "resolver_reasoning": {
                     "explanation": resolver_result['reasoning'],
-                    "mapping": "Category-based deterministic routing"
+                    "mapping": _AUDIT_STATIC["resolver_reasoning_mapping"]
                 },
                 "duplicate_reasoning": {
                     "explanation": duplicate_result['reasoning'],
-                    "method": "Sentence-BERT cosine similarity"
+                    "method": _AUDIT_STATIC["duplicate_method"]
                 },
                 "kb_reasoning": {
                     "explanation": kb_result['reasoning'],
-                    "method": "Embedding-based semantic search"
+                    "method": _AUDIT_STATIC["kb_method"]
                 }
             },
             "processing_time_ms": round(processing_time, 2),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _fast_iso(time.time_ns())
         }
         
-        return response
+        return ORJSONResponse(content=response)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    
+    finally:
+        # On failure the sibling stages would keep running (holding cpu_limiter slots) with unretrieved errors
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # An import string is required for multiple workers; "auto" picks uvloop/httptools when installed
+    # (uvicorn[standard]) and falls back to asyncio/h11 where they are unavailable, e.g. on Windows
+    uvicorn.run(
+        "main:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=API_WORKERS,
+        loop="auto",
+        http="auto",
+        log_level="warning"
+    )
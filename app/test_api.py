@@ -2,11 +2,12 @@
 API Test Suite - Tests all edge cases and scenarios
 """
 
-import requests
+import asyncio
+import httpx
 import json
 from datetime import datetime
 
-API_URL = "http://localhost:8000/predict"
+API_BASE_URL = "http://localhost:8000"
 
 # Test cases (13 edge cases from hackathon demo)
 test_cases = [
@@ -187,7 +188,7 @@ test_cases = [
     }
 ]
 
-def test_api():
+async def test_api():
     """Run all test cases"""
     print("🧪 ITSM AI API Test Suite")
     print("=" * 60)
@@ -197,13 +198,20 @@ def test_api():
     failed = 0
     errors = []
     
-    for i, test in enumerate(test_cases, 1):
+    # Fire every request at once over pooled keep-alive connections; results come back in test order
+    async with httpx.AsyncClient(base_url=API_BASE_URL, timeout=30) as client:
+        responses = await asyncio.gather(
+            *(client.post("/predict", json=test['data']) for test in test_cases),
+            return_exceptions=True
+        )
+    
+    for i, (test, response) in enumerate(zip(test_cases, responses), 1):
         print(f"Test {i}/{len(test_cases)}: {test['name']}")
         print("-" * 60)
         
         try:
-            # Make API request
-            response = requests.post(API_URL, json=test['data'], timeout=30)
+            if isinstance(response, Exception):
+                raise response
             
             if response.status_code != 200:
                 print(f"❌ FAILED: HTTP {response.status_code}")
@@ -270,7 +278,7 @@ def test_api():
                 insights = result['rag_insights']['proactive_insights']['insights']
                 print(f"   💡 Insights: {len(insights)} proactive recommendations")
             
-        except requests.exceptions.RequestException as e:
+        except httpx.RequestError as e:
             print(f"❌ FAILED: Connection error")
             print(f"   Error: {e}")
             failed += 1
@@ -315,14 +323,14 @@ if __name__ == "__main__":
     
     # Check if API is running
     try:
-        response = requests.get("http://localhost:8000/health", timeout=5)
+        response = httpx.get(f"{API_BASE_URL}/health", timeout=5)
         if response.status_code == 200:
             print("✅ API is healthy and ready")
             print()
-            test_api()
+            asyncio.run(test_api())
         else:
             print("❌ API returned non-200 status")
             print("Please start the API first: python app/main.py")
-    except requests.exceptions.RequestException:
+    except httpx.RequestError:
         print("❌ Cannot connect to API")
         print("Please start the API first: python app/main.py")
@@ -2,6 +2,10 @@
 Configuration settings for ITSM AI API
 """
 
+import os
+from pathlib import Path
+from types import MappingProxyType
+
 # HuggingFace Model Repository
 HUGGINGFACE_REPO = "viveksai12/itsm-ticket-classifier"
 
@@ -14,8 +18,14 @@ MODEL_FILES = [
     "urgency_encoder.pkl"
 ]
 
-# Category to Resolver Mapping (11 categories → 7 resolver groups)
-CATEGORY_RESOLVER_MAP = {
+# Memory-map numpy arrays inside joblib artifacts (read-only, pages loaded on demand); set MODEL_MMAP=0 to debug
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+
+# Inference backend for resolver_router: "onnx" (ONNX Runtime TreeEnsemble) or "sklearn"
+RESOLVER_BACKEND = os.getenv("RESOLVER_BACKEND", "onnx")
+
+# Category to Resolver Mapping (11 categories → 7 resolver groups), read-only
+CATEGORY_RESOLVER_MAP = MappingProxyType({
     "Network": "Network Team",
     "Hardware": "Service Desk",
     "Software": "App Support",
@@ -27,7 +37,7 @@ CATEGORY_RESOLVER_MAP = {
     "Email": "Service Desk",
     "Monitoring": "Cloud Ops",
     "Service Request": "Service Desk"
-}
+})
 
 # Priority Rules (Impact × Urgency matrix)
 PRIORITY_MATRIX = {
@@ -45,17 +55,47 @@ PRIORITY_MATRIX = {
 # Duplicate Detection Settings
 DUPLICATE_SIMILARITY_THRESHOLD = 0.70  # 70% similarity threshold
 DUPLICATE_MAX_RESULTS = 5  # Return max 5 similar tickets
+CLUSTER_MIN_ITEMS = 500  # Below this many historical tickets, scan them all
+CLUSTER_PROBES = 2  # Nearest k-means clusters scanned per query
+ANN_BACKEND = os.getenv("ANN_BACKEND", "hnsw")  # Large-corpus shortlist: "hnsw" (hnswlib, when installed) or "kmeans"
+HNSW_M = 16  # Graph links per node
+HNSW_EF_CONSTRUCTION = 200  # Build-time candidate list size
+HNSW_CANDIDATES = 64  # Approximate neighbours per query, re-scored exactly against the stored rows
+HISTORY_PATH = os.getenv("HISTORY_PATH", str(Path(__file__).parent / "history.json"))  # Optional startup ticket history
+
+# Two-stage retrieval: TF-IDF shortlist, then Sentence-BERT re-ranks only the shortlist (skips encoding whole corpora)
+FAST_RETRIEVAL = os.getenv("FAST_RETRIEVAL", "0") == "1"
+FAST_RETRIEVAL_CANDIDATES = 50  # Rows re-ranked by Sentence-BERT per query
 
 # Knowledge Base Settings
 KB_TOP_K = 3  # Return top 3 knowledge base articles
 KB_MIN_SIMILARITY = 0.65  # Minimum similarity for KB matching
+KB_PATH = os.getenv("KB_PATH", str(Path(__file__).parent / "kb.json"))  # Optional startup knowledge base
 
 # SentenceTransformer Model for Embeddings
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MODEL_REVISION = os.getenv("EMBEDDING_MODEL_REVISION", "main")  # HF branch/tag/commit; pin a commit for reproducible exports
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")  # "onnx" (INT8 ONNX Runtime) or "torch"
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "128"))  # Tokens kept per text (~p95 ticket length)
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", os.getenv("TORCH_THREADS", "2")))  # Intra-op threads per Sentence-BERT encode (PyTorch or ONNX Runtime)
+TORCH_THREADS = ENCODER_THREADS  # Intra-op threads per process for PyTorch inference
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "auto")  # PyTorch backend weights: "auto", "float32", "float16" or "bfloat16"
+
+# Embedding Cache Settings
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "models/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))  # Persisted corpus vectors kept (oldest writes evicted)
+QUERY_EMBEDDING_CACHE_SIZE = 4096  # In-process LRU entries for ticket texts (never persisted)
+SMART_BATCH_TOKENS = 2048  # Padded-token budget per length-sorted encode batch (~64 typical tickets)
+CORPUS_CACHE_SIZE = 32  # KB / historical-ticket matrices kept in memory per engine
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float16")  # Search matrix dtype: "float16", "int8" or "float32"
 
 # API Settings
 API_TITLE = "ITSM AI-Driven Intelligent Ticketing API"
 API_VERSION = "1.0.0"
+PREDICTION_THREADS = int(os.getenv("PREDICTION_THREADS", str(max(2, (os.cpu_count() or 1) - 1))))  # Concurrent prediction-stage threads
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # Server processes for `python app/main.py`; each loads its own models
 API_DESCRIPTION = """
 🎯 **AI-Powered ITSM Ticketing System** - Hackathon Track 4
 
@@ -76,6 +116,13 @@ API_DESCRIPTION = """
 - HuggingFace Deployed: `viveksai12/itsm-ticket-classifier`
 """
 
+# Prediction Cache: LRU entries per stage, keyed by normalized ticket text
+PREDICTION_CACHE_SIZE = 2048
+
+# Keyword Prescreen: route without the ML resolver when one category clearly dominates
+KEYWORD_SHORTCUT_MIN_HITS = 3  # Distinct keyword hits for the top category
+KEYWORD_SHORTCUT_RATIO = 2.0  # Top category hits must be at least this multiple of the runner-up
+
 # Keywords for Enhanced Classification
 CATEGORY_KEYWORDS = {
     "Network": ["network", "vpn", "wifi", "connection", "internet", "router", "firewall", "dns", "ip", "connectivity"],
@@ -91,8 +138,8 @@ CATEGORY_KEYWORDS = {
     "Service Request": ["request", "new user", "provisioning", "onboarding", "setup", "create"]
 }
 
-# Response Templates for Auto-Draft
-RESPONSE_TEMPLATES = {
+# Response Templates for Auto-Draft (static text, read-only)
+RESPONSE_TEMPLATES = MappingProxyType({
     "Network": """**Resolution Steps:**
 1. Verify network connectivity and firewall rules
 2. Check VPN configuration and certificates
@@ -202,4 +249,4 @@ RESPONSE_TEMPLATES = {
 
 **Expected Resolution Time:** 4-24 hours (depends on approval process)
 **Priority:** Low-Medium unless urgent business need"""
-}
+})
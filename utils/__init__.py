@@ -5,5 +5,8 @@ Initialize utils package
 from .model_loader import ModelLoader
 from .predictor import TicketPredictor
 from .rag_engine import RAGEngine
+from .embedding_cache import EmbeddingCache
+from .ticket_store import TicketStore
+from .lexical_prefilter import LexicalPrefilter
 
-__all__ = ['ModelLoader', 'TicketPredictor', 'RAGEngine']
+__all__ = ['ModelLoader', 'TicketPredictor', 'RAGEngine', 'EmbeddingCache', 'TicketStore', 'LexicalPrefilter']
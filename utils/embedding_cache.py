@@ -0,0 +1,282 @@
+"""
+Embedding Cache - Persists Sentence-BERT embeddings so repeated texts skip the encoder
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+import numpy as np
+from config.settings import (
+    EMBEDDING_MODEL, QUERY_EMBEDDING_CACHE_SIZE, SMART_BATCH_TOKENS, CORPUS_CACHE_SIZE, EMBEDDING_CACHE_MAX_ROWS
+)
+from utils.vector_index import VectorIndex
+
+# SQLite caps the number of bound parameters per statement
+_SQLITE_BATCH = 500
+
+def _inference_context(model):
+    """torch.inference_mode() for PyTorch models, a no-op for the ONNX encoder"""
+    if hasattr(model, 'parameters'):
+        import torch
+        return torch.inference_mode()
+    return nullcontext()
+
+def encode_smart(model, texts, target_tokens=SMART_BATCH_TOKENS, **kwargs):
+    """Encode texts in length-sorted batches so little compute is spent on padding"""
+    texts = list(texts)
+    if len(texts) <= 1:
+        with _inference_context(model):
+            return model.encode(texts, show_progress_bar=False, **kwargs)
+    
+    # Token lengths as the model will see them (truncated to max_seq_length)
+    input_ids = model.tokenizer(texts, add_special_tokens=True)['input_ids']
+    max_length = getattr(model, 'max_seq_length', None) or max(len(ids) for ids in input_ids)
+    lengths = np.array([min(len(ids), max_length) for ids in input_ids])
+    order = np.argsort(lengths, kind='stable')
+    
+    # Group sorted texts so each batch's padded size (rows × longest row) stays under target
+    batches = []
+    batch = []
+    for idx in order:
+        if batch and (len(batch) + 1) * lengths[idx] > target_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(idx)
+    batches.append(batch)
+    
+    with _inference_context(model):
+        encoded = [
+            model.encode([texts[i] for i in batch], batch_size=len(batch), show_progress_bar=False, **kwargs)
+            for batch in batches
+        ]
+    
+    # Undo the length sort so rows line up with the input order
+    embeddings = np.empty((len(texts),) + encoded[0].shape[1:], dtype=encoded[0].dtype)
+    embeddings[order] = np.concatenate(encoded)
+    return embeddings
+
+def corpus_fingerprint(texts):
+    """Content hash identifying a whole corpus (order-sensitive)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.digest()
+
+class EmbeddingCache:
+    def __init__(self, path=None, model_name=EMBEDDING_MODEL, max_concurrent_encodes=None):
+        self.path = path or ":memory:"
+        self.model_name = model_name
+        
+        # Every encoder call (queries and corpora) goes through here, so this bounds concurrent encodes process-wide
+        self._encode_slots = threading.BoundedSemaphore(max_concurrent_encodes) if max_concurrent_encodes else None
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        # Shared across request threads, so all access goes through the lock
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._rows = 0
+        with self._lock:
+            self._connection()
+        
+        # Bounded: once over max_rows, the least recently written vectors are evicted
+        self.max_rows = EMBEDDING_CACHE_MAX_ROWS
+
+        # In-process front cache for the ticket text itself, keyed by a 16-byte digest rather than the text
+        self.query_cache_size = QUERY_EMBEDDING_CACHE_SIZE
+        self._query_vectors = OrderedDict()
+        self._query_lock = threading.Lock()
+
+    def _connection(self):
+        """
+        SQLite connection owned by the current process (a connection must not be used across fork).
+        Each new connection gets the schema, since a forked worker's ":memory:" database starts empty.
+        """
+        if self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self.path != ":memory:":
+                # Several worker processes share the file: WAL lets readers proceed while one of them writes
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            conn.commit()
+            self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _key(self, model_name, text):
+        """Hash text with the model name prefix so different models never collide"""
+        return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        """Fetch cached vectors for the given keys"""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[start:start + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection().execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _store(self, vectors):
+        """Write newly encoded vectors back to the store"""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in vectors.items()]
+            )
+            
+            # The running count is an upper bound (replaced keys and other processes); recount only when it trips
+            self._rows += len(vectors)
+            if self._rows > self.max_rows:
+                self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = self._rows - self.max_rows
+                if excess > 0:
+                    # INSERT OR REPLACE gives rewritten keys a new rowid, so low rowids are the oldest writes
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+                        (excess,)
+                    )
+                    self._rows = self.max_rows
+            conn.commit()
+
+    def _encode_uncached(self, model, texts):
+        """Run the encoder (bounded by the encode slots) and return float32 L2-normalized rows"""
+        with self._encode_slots or nullcontext():
+            embeddings = encode_smart(model, texts, convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode(self, model, texts):
+        """Encode texts, running the model only on texts missing from the cache"""
+        model_name = getattr(model, 'cache_name', self.model_name)
+        keys = [self._key(model_name, text) for text in texts]
+        vectors = self._lookup(set(keys))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            new_vectors = dict(zip(missing.keys(), self._encode_uncached(model, list(missing.values()))))
+            self._store(new_vectors)
+            vectors.update(new_vectors)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack([vectors[key] for key in keys])
+
+    def encode_query(self, model, text):
+        """
+        Encode a single text as a read-only (1, d) array, served from the LRU front cache when possible.
+        Ticket texts are mostly one-off, so they stay in memory and are never written to the SQLite store.
+        """
+        model_name = getattr(model, 'cache_name', self.model_name)
+        key = hashlib.blake2b(f"{model_name}\x00{text}".encode("utf-8"), digest_size=16).digest()
+        with self._query_lock:
+            vector = self._query_vectors.get(key)
+            if vector is not None:
+                self._query_vectors.move_to_end(key)
+                return vector
+
+        vector = self._encode_uncached(model, [text])
+        # Shared between requests, so callers must not be able to modify it in place
+        vector.setflags(write=False)
+
+        with self._query_lock:
+            self._query_vectors[key] = vector
+            while len(self._query_vectors) > self.query_cache_size:
+                self._query_vectors.popitem(last=False)
+        return vector
+
+    def close(self):
+        """Close the underlying store"""
+        with self._lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._conn_pid = None
+
+class CorpusCache:
+    """Keeps a search index per corpus in memory, keyed by content fingerprint"""
+
+    def __init__(self, embedding_cache, max_entries=CORPUS_CACHE_SIZE, cluster=False, store_dir=None, name="corpus"):
+        self.embedding_cache = embedding_cache
+        self.name = name
+        self.cluster = cluster
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Startup corpora are persisted as whole matrices next to a persistent embedding cache,
+        # so a restart loads each with one file read instead of N row lookups. Files are prefixed with name:
+        # one startup corpus per cache, so writing a new matrix replaces the previous one
+        if store_dir is None and embedding_cache.path != ":memory:":
+            store_dir = Path(embedding_cache.path).parent / "corpus_embeddings"
+        self.store_dir = Path(store_dir) if store_dir else None
+    
+    def _matrix_path(self, model, key):
+        """File holding the corpus matrix for this model and content fingerprint"""
+        model_name = getattr(model, 'cache_name', self.embedding_cache.model_name)
+        file_key = hashlib.blake2b(model_name.encode("utf-8") + key, digest_size=16).hexdigest()
+        return self.store_dir / f"{self.name}-{file_key}.npy"
+    
+    def _embed(self, model, texts, key, persist):
+        """Embedding matrix for texts, read from / written to the corpus store when persist is set"""
+        if not persist or self.store_dir is None:
+            return self.embedding_cache.encode(model, texts)
+        
+        path = self._matrix_path(model, key)
+        if path.exists():
+            embeddings = np.load(path)
+            if embeddings.shape[0] == len(texts):
+                return embeddings
+        
+        embeddings = self.embedding_cache.encode(model, texts)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, path)
+        
+        # Drop the matrix of the previous startup corpus (e.g. before kb.json / history.json was edited)
+        for stale in self.store_dir.glob(f"{self.name}-*.npy"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        return embeddings
+
+    def get_index(self, model, texts, persist=False, key=None):
+        """Return the VectorIndex for texts, reusing it when the same corpus was seen before"""
+        if key is None:
+            key = corpus_fingerprint(texts)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        # Only startup corpora get the approximate shortlist: per-request corpora change with every new ticket,
+        # and an exact scan costs far less than rebuilding a graph / k-means for each new fingerprint
+        index = VectorIndex(self._embed(model, texts, key, persist), cluster=self.cluster and persist)
+
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
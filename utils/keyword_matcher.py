@@ -0,0 +1,63 @@
+"""
+Keyword Matcher - Finds every configured keyword in a text with a single Aho-Corasick pass
+"""
+
+import re
+import numpy as np
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional; fall back to one compiled regex alternation
+    ahocorasick = None
+
+class KeywordMatcher:
+    def __init__(self, groups):
+        """groups maps a group name (e.g. a category) to its keywords; a keyword may be in several groups"""
+        self.groups = {group: [kw.lower() for kw in keywords] for group, keywords in groups.items()}
+
+        self.keyword_groups = {}
+        for group, keywords in self.groups.items():
+            for kw in keywords:
+                self.keyword_groups.setdefault(kw, []).append(group)
+
+        # groups × keywords membership matrix: per-group counts are one product with the hit vector
+        self.keyword_index = {kw: i for i, kw in enumerate(self.keyword_groups)}
+        self.group_matrix = np.zeros((len(self.groups), len(self.keyword_index)), dtype=np.int32)
+        for row, keywords in enumerate(self.groups.values()):
+            for kw in keywords:
+                self.group_matrix[row, self.keyword_index[kw]] += 1
+
+        self._automaton = None
+        self._pattern = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for kw in self.keyword_groups:
+                automaton.add_word(kw, kw)
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            # A longest-first alternation inside a lookahead yields the longest keyword starting at each
+            # position; any other keyword starting there is a prefix of it, so those come from a table
+            ordered = sorted(self.keyword_groups, key=len, reverse=True)
+            self._pattern = re.compile("(?=(" + "|".join(map(re.escape, ordered)) + "))")
+            self._prefixes = {
+                kw: [other for other in self.keyword_groups if kw.startswith(other)]
+                for kw in self.keyword_groups
+            }
+
+    def find(self, text):
+        """Distinct keywords occurring anywhere in text (substring semantics, text already lowercased)"""
+        if self._automaton is not None:
+            return {kw for _, kw in self._automaton.iter(text)}
+        matched = set()
+        for longest in self._pattern.findall(text):
+            matched.update(self._prefixes[longest])
+        return matched
+
+    def counts(self, text, matched=None):
+        """Number of distinct matched keywords per group, in group order"""
+        if matched is None:
+            matched = self.find(text)
+        hits = np.zeros(len(self.keyword_index), dtype=np.int32)
+        hits[[self.keyword_index[kw] for kw in matched]] = 1
+        return dict(zip(self.groups, (self.group_matrix @ hits).tolist()))
@@ -0,0 +1,48 @@
+"""
+Lexical Prefilter - TF-IDF first stage that shortlists corpus rows before Sentence-BERT re-ranking
+"""
+
+import threading
+from collections import OrderedDict
+from config.settings import CORPUS_CACHE_SIZE, FAST_RETRIEVAL_CANDIDATES
+from utils.vector_index import normalize_rows, top_k_indices
+
+class LexicalPrefilter:
+    def __init__(self, tfidf, embedding_cache, max_entries=CORPUS_CACHE_SIZE):
+        self.tfidf = tfidf
+        self.embedding_cache = embedding_cache
+        self.max_entries = max_entries
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _matrix(self, store):
+        """L2-normalized TF-IDF rows for a TicketStore, cached by its fingerprint"""
+        with self._lock:
+            matrix = self._matrices.get(store.fingerprint)
+            if matrix is not None:
+                self._matrices.move_to_end(store.fingerprint)
+                return matrix
+
+        matrix = self.tfidf.transform(store.texts).tocsr()
+
+        with self._lock:
+            self._matrices[store.fingerprint] = matrix
+            while len(self._matrices) > self.max_entries:
+                self._matrices.popitem(last=False)
+        return matrix
+
+    def shortlist(self, store, query_text, k=FAST_RETRIEVAL_CANDIDATES):
+        """Indices of the k rows with the highest sparse TF-IDF cosine to the query"""
+        lexical = (self._matrix(store) @ self.tfidf.transform([query_text]).T).toarray().ravel()
+        return top_k_indices(lexical, k)
+
+    def search(self, model, store, query_text, query_vec, k):
+        """
+        Same return shape as VectorIndex.search, but only the TF-IDF shortlist is embedded and scored,
+        so the last value covers the shortlisted rows rather than the whole corpus.
+        """
+        candidates = self.shortlist(store, query_text)
+        embeddings = self.embedding_cache.encode(model, [store.texts[i] for i in candidates])
+        scanned = embeddings @ normalize_rows(query_vec)[0]
+        top = top_k_indices(scanned, k)
+        return candidates[top], scanned[top], scanned
@@ -2,19 +2,32 @@
 Model Loader - Loads models from local directory or downloads from HuggingFace
 """
 
+import hashlib
 import os
 import pickle
+from importlib.util import find_spec
 import joblib
 from pathlib import Path
-from huggingface_hub import hf_hub_download
+
+# hf_transfer parallelizes chunked downloads; only enable it when installed (the hub errors otherwise).
+# Must be set before huggingface_hub is imported.
+if find_spec("hf_transfer") is not None:
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+from huggingface_hub import hf_hub_download, snapshot_download
 from sentence_transformers import SentenceTransformer
-from config.settings import HUGGINGFACE_REPO, MODEL_FILES, EMBEDDING_MODEL
+from config.settings import (
+    HUGGINGFACE_REPO, MODEL_FILES, EMBEDDING_MODEL, EMBEDDING_BACKEND, RESOLVER_BACKEND, EMBEDDING_MAX_SEQ_LENGTH,
+    MODEL_MMAP, EMBEDDING_PRECISION
+)
+from utils.onnx_models import ONNXSentenceEncoder, ONNXClassifier
 
 class ModelLoader:
     def __init__(self):
         self.models_dir = Path("models")
         self.models_dir.mkdir(exist_ok=True)
         self.models = {}
+        self.model_paths = {}
         
         # Check for local models in parent directory
         parent_models_improved = Path(__file__).parent.parent.parent / "models_improved"
@@ -40,14 +53,7 @@ class ModelLoader:
                 try:
                     local_path = self.local_models_path / model_file
                     if local_path.exists():
-                        # Try joblib first (better for scikit-learn), then pickle
-                        try:
-                            self.models[model_file.replace('.pkl', '')] = joblib.load(local_path)
-                            print(f"✅ Loaded (joblib): {model_file}")
-                        except:
-                            with open(local_path, 'rb') as f:
-                                self.models[model_file.replace('.pkl', '')] = pickle.load(f)
-                            print(f"✅ Loaded (pickle): {model_file}")
+                        self.models[model_file.replace('.pkl', '')] = self._load_file(local_path, model_file)
                     else:
                         print(f"⚠️ File not found locally: {model_file}")
                 except Exception as e:
@@ -56,31 +62,127 @@ class ModelLoader:
         else:
             # Download from HuggingFace
             print(f"📥 Downloading models from {HUGGINGFACE_REPO}...")
+            
+            # Fetch all model files in parallel; anything missing afterwards is retried one file at a time
+            try:
+                snapshot_dir = Path(snapshot_download(
+                    repo_id=HUGGINGFACE_REPO,
+                    allow_patterns=MODEL_FILES,
+                    cache_dir=str(self.models_dir),
+                    max_workers=8
+                ))
+                print(f"✅ Downloaded {len(MODEL_FILES)} model files")
+            except Exception as e:
+                print(f"⚠️ Parallel download failed ({e}), downloading files one by one")
+                snapshot_dir = None
+            
             for model_file in MODEL_FILES:
                 try:
-                    local_path = hf_hub_download(
-                        repo_id=HUGGINGFACE_REPO,
-                        filename=model_file,
-                        cache_dir=str(self.models_dir)
-                    )
-                    print(f"✅ Downloaded: {model_file}")
+                    local_path = snapshot_dir / model_file if snapshot_dir else None
+                    if local_path is None or not local_path.exists():
+                        local_path = hf_hub_download(
+                            repo_id=HUGGINGFACE_REPO,
+                            filename=model_file,
+                            cache_dir=str(self.models_dir)
+                        )
+                        print(f"✅ Downloaded: {model_file}")
                     
                     # Load the model
-                    with open(local_path, 'rb') as f:
-                        self.models[model_file.replace('.pkl', '')] = pickle.load(f)
+                    self.models[model_file.replace('.pkl', '')] = self._load_file(local_path, model_file)
                         
                 except Exception as e:
                     print(f"❌ Error downloading {model_file}: {e}")
                     raise
         
+        # Serve the resolver forest through ONNX Runtime when enabled
+        if RESOLVER_BACKEND == "onnx":
+            self.models['resolver_router'] = self._load_resolver_onnx(self.models['resolver_router'])
+        
         # Load Sentence-BERT for duplicate detection
-        print(f"📥 Loading Sentence-BERT model: {EMBEDDING_MODEL}...")
-        self.models['sentence_bert'] = SentenceTransformer(EMBEDDING_MODEL)
-        print("✅ Sentence-BERT loaded")
+        self.models['sentence_bert'] = self._load_sentence_bert()
         
         print(f"✅ All models loaded successfully!")
         return self.models
     
+    def _load_file(self, path, model_file):
+        """Load one artifact: joblib first (better for scikit-learn, memory-mapped when enabled), then pickle"""
+        self.model_paths[model_file] = Path(path)
+        try:
+            model = joblib.load(path, mmap_mode='r' if MODEL_MMAP else None)
+            print(f"✅ Loaded (joblib{', mmap' if MODEL_MMAP else ''}): {model_file}")
+        except Exception:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            print(f"✅ Loaded (pickle): {model_file}")
+        return model
+    
+    def _load_resolver_onnx(self, resolver_model):
+        """Convert the resolver model to ONNX, keeping the scikit-learn model if that fails"""
+        try:
+            onnx_model = ONNXClassifier.convert(
+                resolver_model,
+                self.models_dir / "onnx" / "resolver_router.onnx",
+                self._file_digest(self.model_paths["resolver_router.pkl"])
+            )
+            print("✅ Resolver model loaded (ONNX Runtime)")
+            return onnx_model
+        except Exception as e:
+            print(f"⚠️ ONNX conversion unavailable ({e}), using scikit-learn resolver")
+            return resolver_model
+    
+    def _file_digest(self, path):
+        """Short content hash of an artifact file (streamed, so the file is never held in memory twice)"""
+        digest = hashlib.blake2b(digest_size=8)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _load_sentence_bert(self):
+        """Load Sentence-BERT, preferring the INT8 ONNX Runtime export when enabled"""
+        if EMBEDDING_BACKEND == "onnx":
+            try:
+                print(f"📥 Loading Sentence-BERT model (ONNX INT8): {EMBEDDING_MODEL}...")
+                encoder = ONNXSentenceEncoder.export(EMBEDDING_MODEL, self.models_dir / "onnx")
+                print("✅ Sentence-BERT loaded (ONNX Runtime INT8)")
+                return encoder
+            except Exception as e:
+                print(f"⚠️ ONNX export unavailable ({e}), falling back to PyTorch")
+        
+        print(f"📥 Loading Sentence-BERT model: {EMBEDDING_MODEL}...")
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        # Tickets are short: truncating at ~p95 length cuts padded-token compute for the long tail
+        model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+        # Inference only: no dropout, no autograd bookkeeping
+        model.eval()
+        model.requires_grad_(False)
+        
+        # Half-precision weights roughly double throughput where the hardware computes them natively;
+        # vectors differ slightly from FP32 ones, so the precision is part of the embedding cache key
+        precision = self._embedding_precision(model)
+        if precision != "float32":
+            import torch
+            model.to(getattr(torch, precision))
+        model.cache_name = f"{EMBEDDING_MODEL}:{EMBEDDING_MAX_SEQ_LENGTH}:{precision}"
+        print(f"✅ Sentence-BERT loaded ({precision})")
+        return model
+    
+    def _embedding_precision(self, model):
+        """Resolve EMBEDDING_PRECISION: "auto" picks float16 on CUDA, bfloat16 on CPUs with native BF16, else float32"""
+        if EMBEDDING_PRECISION != "auto":
+            return EMBEDDING_PRECISION
+        
+        import torch
+        if model.device.type == "cuda":
+            return "float16"
+        try:
+            if torch.ops.mkldnn._is_mkldnn_bf16_supported():
+                return "bfloat16"
+        except (AttributeError, RuntimeError):
+            pass
+        # Emulated BF16 on CPUs without AVX-512-BF16/AMX is slower than FP32
+        return "float32"
+    
     def get_models(self):
         """Get loaded models"""
         if not self.models:
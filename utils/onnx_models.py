@@ -0,0 +1,197 @@
+"""
+ONNX Models - ONNX Runtime replacements for the PyTorch/scikit-learn inference paths
+"""
+
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from config.settings import EMBEDDING_MODEL, EMBEDDING_MODEL_REVISION, EMBEDDING_MAX_SEQ_LENGTH, ENCODER_THREADS
+
+QUANTIZED_FILE = "model_quantized.onnx"
+
+class _ProcessLocalSession:
+    """
+    ONNX Runtime session re-created after fork: a session's thread pool does not survive into a
+    child process, so gunicorn --preload workers each open their own on first use.
+    """
+
+    def __init__(self, path, options):
+        self.path = str(path)
+        self.options = options
+        self._session = None
+        self._pid = None
+
+    def get(self):
+        if self._pid != os.getpid():
+            import onnxruntime as ort
+            self._session = ort.InferenceSession(
+                self.path,
+                sess_options=self.options,
+                providers=['CPUExecutionProvider']
+            )
+            self._pid = os.getpid()
+        return self._session
+
+class ONNXSentenceEncoder:
+    """SentenceTransformer-compatible encoder running a dynamically quantized INT8 ONNX graph"""
+
+    def __init__(self, model_dir, max_seq_length=EMBEDDING_MAX_SEQ_LENGTH, model_id=EMBEDDING_MODEL):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = Path(model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        self.max_seq_length = max_seq_length
+
+        # Quantized (and differently truncated) vectors differ from FP32 ones, so keep them apart in the embedding cache
+        self.cache_name = f"{model_id}:onnx-int8:{max_seq_length}"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Same per-encode thread budget as the PyTorch backend (ONNX Runtime would otherwise use every core)
+        options.intra_op_num_threads = ENCODER_THREADS
+        self._session = _ProcessLocalSession(self.model_dir / QUANTIZED_FILE, options)
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    @property
+    def session(self):
+        return self._session.get()
+
+    @classmethod
+    def export(cls, model_name, save_dir, revision=EMBEDDING_MODEL_REVISION):
+        """Export the HuggingFace model to ONNX and quantize it (reuses a previous export of the same model on disk)"""
+        # One directory per model id and revision, so changing EMBEDDING_MODEL never reuses another model's graph
+        model_id = f"{model_name}@{revision}"
+        export_dir = Path(save_dir) / model_id.replace("/", "--")
+
+        if not (export_dir / QUANTIZED_FILE).exists():
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+
+            # Build in a private directory and rename it into place once complete
+            tmp_dir = export_dir.with_name(f"{export_dir.name}.{os.getpid()}.tmp")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+            print(f"🔧 Exporting {model_id} to ONNX (one-time)...")
+            ort_model = ORTModelForFeatureExtraction.from_pretrained(model_name, revision=revision, export=True)
+            ort_model.save_pretrained(tmp_dir)
+            AutoTokenizer.from_pretrained(model_name, revision=revision).save_pretrained(tmp_dir)
+
+            print("🔧 Applying dynamic INT8 quantization...")
+            quantizer = ORTQuantizer.from_pretrained(tmp_dir)
+            quantizer.quantize(
+                save_dir=tmp_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            )
+
+            try:
+                os.replace(tmp_dir, export_dir)
+            except OSError:
+                # Another process finished the same export first; keep its copy
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not (export_dir / QUANTIZED_FILE).exists():
+                    raise
+
+        return cls(export_dir, model_id=model_id)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=True, **kwargs):
+        """Tokenize, run the ONNX session, mean-pool and L2-normalize (mirrors SentenceTransformer.encode)"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        sentences = list(sentences)
+
+        chunks = []
+        for start in range(0, len(sentences), batch_size):
+            features = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            inputs = {
+                name: features[name].astype(np.int64)
+                for name in self._input_names
+                if name in features
+            }
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real (non-padding) tokens
+            mask = features['attention_mask'][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            chunks.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+
+        embeddings = np.concatenate(chunks).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+        return embeddings[0] if single else embeddings
+
+class ONNXClassifier:
+    """Drop-in predict/predict_proba for a fitted scikit-learn classifier, served by ONNX Runtime"""
+
+    def __init__(self, path, classes, n_features=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # The API already runs requests in parallel, so keep each session single-threaded
+        options.intra_op_num_threads = 1
+        self._session = _ProcessLocalSession(path, options)
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        self.classes_ = np.asarray(classes)
+
+        # Fail at load time, not on the first request, if the graph doesn't fit the current feature layout
+        if n_features is not None and model_input.shape[1] != n_features:
+            raise ValueError(f"{Path(path).name} expects {model_input.shape[1]} features, model has {n_features}")
+
+    @property
+    def session(self):
+        return self._session.get()
+
+    @classmethod
+    def convert(cls, model, path, source_digest):
+        """
+        Convert the classifier with skl2onnx (reuses a previous conversion of the same model on disk).
+        source_digest identifies the artifact the model was loaded from, so a retrained / re-downloaded
+        model never reuses a stale graph.
+        """
+        path = Path(path)
+        path = path.with_name(f"{path.stem}-{source_digest}{path.suffix}")
+
+        if not path.exists():
+            from skl2onnx import convert_sklearn
+            from skl2onnx.common.data_types import FloatTensorType
+
+            print(f"🔧 Converting {path.stem} to ONNX (one-time)...")
+            onnx_model = convert_sklearn(
+                model,
+                initial_types=[('input', FloatTensorType([None, model.n_features_in_]))],
+                options={id(model): {'zipmap': False}}
+            )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename, so a concurrent loader never opens a half-written graph
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(onnx_model.SerializeToString())
+            os.replace(tmp_path, path)
+
+        return cls(path, model.classes_, n_features=model.n_features_in_)
+
+    def predict_proba(self, X):
+        """Class probabilities, columns ordered like classes_"""
+        if hasattr(X, 'toarray'):
+            X = X.toarray()
+        _, probabilities = self.session.run(None, {self._input_name: np.asarray(X, dtype=np.float32)})
+        return probabilities
+
+    def predict(self, X):
+        """Most probable class label per row"""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
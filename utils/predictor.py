@@ -2,13 +2,105 @@
 Predictor - Makes predictions with all 4 models
 """
 
+import re
+from functools import cached_property, lru_cache
+from types import MappingProxyType
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy.sparse import hstack, csr_matrix
-from config.settings import CATEGORY_RESOLVER_MAP, PRIORITY_MATRIX, DUPLICATE_SIMILARITY_THRESHOLD, CATEGORY_KEYWORDS
+from scipy.sparse import csr_matrix
+from config.settings import (
+    CATEGORY_RESOLVER_MAP, PRIORITY_MATRIX, DUPLICATE_SIMILARITY_THRESHOLD, DUPLICATE_MAX_RESULTS,
+    CATEGORY_KEYWORDS, KEYWORD_SHORTCUT_MIN_HITS, KEYWORD_SHORTCUT_RATIO, PREDICTION_CACHE_SIZE,
+    FAST_RETRIEVAL, FAST_RETRIEVAL_CANDIDATES
+)
+from utils.embedding_cache import EmbeddingCache, CorpusCache
+from utils.keyword_matcher import KeywordMatcher
+from utils.ticket_store import TicketStore
+from utils.lexical_prefilter import LexicalPrefilter
+
+# Keyword features fed to the resolver model - must match exact order from training script
+TRAINING_KEYWORD_FEATURES = {
+    'has_network_keyword': ['network', 'vpn', 'wifi', 'connection', 'internet', 'router', 'firewall', 'dns', 'ip'],
+    'has_hardware_keyword': ['laptop', 'desktop', 'computer', 'monitor', 'keyboard', 'mouse', 'printer', 'hardware', 'device'],
+    'has_database_keyword': ['database', 'sql', 'query', 'db', 'table', 'replication', 'backup', 'connection pool'],
+    'has_cloud_keyword': ['azure', 'aws', 'cloud', 'vm', 'container', 'kubernetes', 'docker', 's3', 'blob'],
+    'has_security_keyword': ['security', 'malware', 'virus', 'phishing', 'breach', 'unauthorized', 'certificate', 'firewall'],
+    'has_devops_keyword': ['cicd', 'pipeline', 'jenkins', 'git', 'docker', 'kubernetes', 'terraform', 'helm', 'deployment'],
+    'has_email_keyword': ['email', 'outlook', 'mailbox', 'exchange', 'mail', 'inbox', 'outbox', 'smtp']
+}
+
+# IT-related keywords
+IT_KEYWORDS = [
+    'software', 'hardware', 'application', 'system', 'server', 'network', 'computer',
+    'laptop', 'desktop', 'printer', 'email', 'outlook', 'vpn', 'wifi', 'internet',
+    'database', 'sql', 'cloud', 'azure', 'aws', 'access', 'login', 'password',
+    'account', 'security', 'malware', 'virus', 'firewall', 'router', 'switch',
+    'monitor', 'keyboard', 'mouse', 'scanner', 'phone', 'mobile', 'tablet',
+    'error', 'issue', 'bug', 'crash', 'slow', 'not working', 'cannot connect',
+    'installation', 'update', 'patch', 'upgrade', 'license', 'website', 'portal',
+    'api', 'service', 'app', 'program', 'file', 'document', 'backup', 'recovery'
+]
+
+# Non-IT keywords (facilities, HR, etc.)
+NON_IT_KEYWORDS = [
+    'water', 'leakage', 'plumbing', 'bathroom', 'toilet', 'sink', 'faucet',
+    'hvac', 'ac', 'heating', 'cooling', 'temperature', 'furniture', 'chair',
+    'desk', 'table', 'door', 'lock', 'key', 'parking', 'elevator', 'stairs',
+    'cleaning', 'janitor', 'trash', 'garbage', 'cafeteria', 'food', 'lunch',
+    'payroll', 'salary', 'leave', 'vacation', 'sick', 'benefits', 'hr',
+    'building', 'facility', 'maintenance', 'repair', 'construction'
+]
+
+# Impact / urgency keywords, checked High first then Medium
+IMPACT_KEYWORDS = {
+    "High": ["critical", "production", "outage", "down", "all users", "entire"],
+    "Medium": ["multiple", "several", "department", "important", "affecting"]
+}
+URGENCY_KEYWORDS = {
+    "High": ["urgent", "asap", "immediately", "emergency", "critical", "cannot work"],
+    "Medium": ["soon", "today", "need", "important", "affecting work"]
+}
+
+# Category names in CATEGORY_KEYWORDS order (index = position in the score array)
+CATEGORY_NAMES = list(CATEGORY_KEYWORDS)
+
+# Ticket fields embedded for duplicate detection
+HISTORY_TEXT_FIELDS = ('title', 'description')
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(title, description, combined_text=None):
+    """Lowercased, whitespace-collapsed ticket text - the key for the prediction caches"""
+    if combined_text is None:
+        combined_text = f"{title} {description}"
+    return _WHITESPACE.sub(' ', combined_text.lower().strip())
+
+def _freeze(value):
+    """Read-only copy of a prediction result (dicts -> MappingProxyType, lists -> tuples), safe to share from a cache"""
+    if isinstance(value, MappingProxyType):
+        return value
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value):
+    """Fresh mutable copy of a frozen result, so callers can edit it without touching the cached one"""
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def _frozen_cache(func):
+    """LRU cache that stores func's results frozen"""
+    return lru_cache(maxsize=PREDICTION_CACHE_SIZE)(lambda *args: _freeze(func(*args)))
 
 class TicketPredictor:
-    def __init__(self, models):
+    # Exposed so callers can build the shared cache key once per request
+    normalize_text = staticmethod(normalize_text)
+    
+    def __init__(self, models, embedding_cache=None):
 
         self.resolver_model = models['resolver_router']
         self.tfidf = models['tfidf_vectorizer']
@@ -16,39 +108,57 @@ class TicketPredictor:
         self.impact_encoder = models['impact_encoder']
         self.urgency_encoder = models['urgency_encoder']
         self.sentence_bert = models['sentence_bert']
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        self._history_cache = CorpusCache(self.embedding_cache, cluster=True, name="history")
+        self.default_history = None
+        self._prefilter = LexicalPrefilter(self.tfidf, self.embedding_cache)
+        
+        # One automaton over every keyword group (category, training features, IT/non-IT, impact, urgency):
+        # each stage scans the ticket text once
+        self.keyword_matcher = KeywordMatcher({
+            **CATEGORY_KEYWORDS,
+            **TRAINING_KEYWORD_FEATURES,
+            "it": IT_KEYWORDS,
+            "non_it": NON_IT_KEYWORDS,
+            **{f"impact:{level}": keywords for level, keywords in IMPACT_KEYWORDS.items()},
+            **{f"urgency:{level}": keywords for level, keywords in URGENCY_KEYWORDS.items()}
+        })
+        
+        # Recurring tickets skip keyword scoring, TF-IDF and tree traversal entirely. Results are shared between
+        # requests, so they are cached frozen and each caller gets its own mutable copy
+        self._cached = {
+            "category": _frozen_cache(self._predict_category),
+            "priority": _frozen_cache(self._predict_priority),
+            "resolver": _frozen_cache(self._predict_resolver),
+            "tfidf": lru_cache(maxsize=PREDICTION_CACHE_SIZE)(self._vectorize)
+        }
         
-        # Feature names for audit trail
-        self.feature_names = self.tfidf.get_feature_names_out()
+        # impact -> urgency -> priority result, so predictions skip the tuple-keyed PRIORITY_MATRIX lookup
+        # (entries are frozen: every request with the same cell shares them)
+        levels = ("High", "Medium", "Low")
+        self._priority_table = {
+            impact: {urgency: _freeze(self._priority_result(impact, urgency)) for urgency in levels}
+            for impact in levels
+        }
         
+        # Label -> code tables for the resolver features (same codes as LabelEncoder.transform, no array round-trip)
+        self._category_codes = {label: code for code, label in enumerate(self.category_encoder.classes_)}
+        self._impact_codes = {label: code for code, label in enumerate(self.impact_encoder.classes_)}
+        self._urgency_codes = {label: code for code, label in enumerate(self.urgency_encoder.classes_)}
+    
+    @cached_property
+    def feature_names(self):
+        """TF-IDF feature names for the audit trail, materialized on first use (large string array)"""
+        return self.tfidf.get_feature_names_out()
+    
     def is_it_related(self, title, description):
         """Check if ticket is IT-related or irrelevant"""
         combined_text = f"{title} {description}".lower()
         
-        # IT-related keywords
-        it_keywords = [
-            'software', 'hardware', 'application', 'system', 'server', 'network', 'computer',
-            'laptop', 'desktop', 'printer', 'email', 'outlook', 'vpn', 'wifi', 'internet',
-            'database', 'sql', 'cloud', 'azure', 'aws', 'access', 'login', 'password',
-            'account', 'security', 'malware', 'virus', 'firewall', 'router', 'switch',
-            'monitor', 'keyboard', 'mouse', 'scanner', 'phone', 'mobile', 'tablet',
-            'error', 'issue', 'bug', 'crash', 'slow', 'not working', 'cannot connect',
-            'installation', 'update', 'patch', 'upgrade', 'license', 'website', 'portal',
-            'api', 'service', 'app', 'program', 'file', 'document', 'backup', 'recovery'
-        ]
-        
-        # Non-IT keywords (facilities, HR, etc.)
-        non_it_keywords = [
-            'water', 'leakage', 'plumbing', 'bathroom', 'toilet', 'sink', 'faucet',
-            'hvac', 'ac', 'heating', 'cooling', 'temperature', 'furniture', 'chair',
-            'desk', 'table', 'door', 'lock', 'key', 'parking', 'elevator', 'stairs',
-            'cleaning', 'janitor', 'trash', 'garbage', 'cafeteria', 'food', 'lunch',
-            'payroll', 'salary', 'leave', 'vacation', 'sick', 'benefits', 'hr',
-            'building', 'facility', 'maintenance', 'repair', 'construction'
-        ]
-        
         # Count IT vs non-IT keyword matches
-        it_score = sum(1 for kw in it_keywords if kw in combined_text)
-        non_it_score = sum(1 for kw in non_it_keywords if kw in combined_text)
+        match_counts = self.keyword_matcher.counts(combined_text)
+        it_score = match_counts["it"]
+        non_it_score = match_counts["non_it"]
         
         # Only reject if clearly non-IT (non-IT score is significantly higher)
         if non_it_score >= 3 and non_it_score > (it_score * 2):
@@ -57,97 +167,113 @@ class TicketPredictor:
         # Otherwise, accept it (let the ML model handle classification)
         return True, None
     
-    def extract_keywords(self, text):
+    def extract_keywords(self, text, matched=None):
         """Extract category-specific keywords from text - matching training format"""
-        text_lower = text.lower()
-        
-        # Must match exact order from training script
-        keyword_features = {
-            'has_network_keyword': int(any(kw in text_lower for kw in ['network', 'vpn', 'wifi', 'connection', 'internet', 'router', 'firewall', 'dns', 'ip'])),
-            'has_hardware_keyword': int(any(kw in text_lower for kw in ['laptop', 'desktop', 'computer', 'monitor', 'keyboard', 'mouse', 'printer', 'hardware', 'device'])),
-            'has_database_keyword': int(any(kw in text_lower for kw in ['database', 'sql', 'query', 'db', 'table', 'replication', 'backup', 'connection pool'])),
-            'has_cloud_keyword': int(any(kw in text_lower for kw in ['azure', 'aws', 'cloud', 'vm', 'container', 'kubernetes', 'docker', 's3', 'blob'])),
-            'has_security_keyword': int(any(kw in text_lower for kw in ['security', 'malware', 'virus', 'phishing', 'breach', 'unauthorized', 'certificate', 'firewall'])),
-            'has_devops_keyword': int(any(kw in text_lower for kw in ['cicd', 'pipeline', 'jenkins', 'git', 'docker', 'kubernetes', 'terraform', 'helm', 'deployment'])),
-            'has_email_keyword': int(any(kw in text_lower for kw in ['email', 'outlook', 'mailbox', 'exchange', 'mail', 'inbox', 'outbox', 'smtp']))
-        }
+        if matched is None:
+            matched = self.keyword_matcher.find(text.lower())
         
-        return keyword_features
+        return {
+            feature: int(any(kw in matched for kw in keywords))
+            for feature, keywords in TRAINING_KEYWORD_FEATURES.items()
+        }
     
-    def predict_category(self, title, description):
+    def cache_info(self):
+        """Hit/miss statistics of the prediction caches"""
+        return {name: cached.cache_info()._asdict() for name, cached in self._cached.items()}
+    
+    def predict_category(self, title, description, normalized_text=None):
         """Predict ticket category using keyword matching"""
-        combined_text = f"{title} {description}".lower()
-        
-        # Keyword features
-        keyword_features = self.extract_keywords(combined_text)
-        
-        # Score each category based on keyword matches
-        category_scores = {}
-        for category, keywords in CATEGORY_KEYWORDS.items():
-            score = sum(1 for kw in keywords if kw in combined_text)
-            category_scores[category] = score
-        
-        # Get predicted category (highest score)
-        if max(category_scores.values()) > 0:
-            category = max(category_scores, key=category_scores.get)
-            confidence = min(0.95, 0.65 + (category_scores[category] * 0.05))
+        return _thaw(self._cached["category"](normalized_text or normalize_text(title, description)))
+    
+    def _predict_category(self, combined_text):
+        """Category prediction for normalized ticket text (cached by predict_category)"""
+        
+        # Single keyword pass shared by the category scores and the keyword features
+        matched = self.keyword_matcher.find(combined_text)
+        keyword_features = self.extract_keywords(combined_text, matched)
+        
+        # Score each category based on keyword matches (array in CATEGORY_KEYWORDS order)
+        match_counts = self.keyword_matcher.counts(combined_text, matched)
+        category_scores = np.array([match_counts[category] for category in CATEGORY_NAMES])
+        
+        # Top 3 by score, ties broken by CATEGORY_KEYWORDS order (unique keys, so the ranking is exact)
+        rank_keys = category_scores * len(CATEGORY_NAMES) - np.arange(len(CATEGORY_NAMES))
+        top_idx = np.argpartition(-rank_keys, 2)[:3]
+        top_idx = top_idx[np.argsort(-rank_keys[top_idx])]
+        best_score = int(category_scores[top_idx[0]])
+        runner_up_score = int(category_scores[top_idx[1]])
+        
+        if best_score > 0:
+            category = CATEGORY_NAMES[top_idx[0]]
+            confidence = min(0.95, 0.65 + (best_score * 0.05))
+            top_3 = []
+            for i in top_idx:
+                score = int(category_scores[i])
+                conf = min(0.95, 0.65 + (score * 0.05)) if score > 0 else 0.35
+                top_3.append({"category": CATEGORY_NAMES[i], "confidence": conf})
         else:
-            # Default to Software if no keywords match
+            # Default to Software if no keywords match; it leads the (all-zero) ranking
             category = "Software"
             confidence = 0.55
+            top_3 = [{"category": category, "confidence": confidence}] + [
+                {"category": cat, "confidence": 0.35} for cat in CATEGORY_NAMES if cat != category
+            ][:2]
         
-        # Get top 3 predictions
-        sorted_categories = sorted(category_scores.items(), key=lambda x: x[1], reverse=True)
-        top_3 = []
-        for cat, score in sorted_categories[:3]:
-            conf = min(0.95, 0.65 + (score * 0.05)) if score > 0 else 0.35
-            top_3.append({"category": cat, "confidence": conf})
-        
-        # Ensure we have 3 items
-        while len(top_3) < 3:
-            remaining = [c for c in CATEGORY_KEYWORDS.keys() if c not in [t["category"] for t in top_3]]
-            if remaining:
-                top_3.append({"category": remaining[0], "confidence": 0.30})
-            else:
-                break
-        
-        # Ensure predicted category is first
-        if top_3[0]["category"] != category:
-            top_3 = [{"category": category, "confidence": confidence}] + [t for t in top_3 if t["category"] != category][:2]
+        # Obvious tickets (one category clearly dominates) can skip the ML resolver
+        keyword_shortcut = (
+            best_score >= KEYWORD_SHORTCUT_MIN_HITS
+            and best_score >= KEYWORD_SHORTCUT_RATIO * runner_up_score
+        )
         
         # Feature importance based on matched keywords
         feature_importance = []
         if category in CATEGORY_KEYWORDS:
             for kw in CATEGORY_KEYWORDS[category]:
-                if kw in combined_text:
+                if kw in matched:
                     feature_importance.append({"feature": kw, "importance": 0.08})
         
         return {
             "category": category,
             "confidence": confidence,
-            "top_3": top_3[:3],
+            "top_3": top_3,
             "keyword_matches": keyword_features,
-            "feature_importance": feature_importance[:10]
+            "keyword_shortcut": keyword_shortcut,
+            "feature_importance": feature_importance[:10],
+            # Raw keyword hits, so the priority stage doesn't rescan the text
+            "matched_keywords": frozenset(matched)
         }
     
-    def predict_priority(self, title, description, category):
-        """Predict ticket priority based on impact and urgency"""
-        combined_text = f"{title} {description}".lower()
+    def predict_priority(self, title, description, category, normalized_text=None, matched_keywords=None):
+        """Predict ticket priority based on impact and urgency (matched_keywords: the category stage's hits)"""
+        return _thaw(self._cached["priority"](
+            normalized_text or normalize_text(title, description), category, matched_keywords
+        ))
+    
+    def _predict_priority(self, combined_text, category, matched_keywords):
+        """Priority prediction for normalized ticket text (cached by predict_priority)"""
+        
+        match_counts = self.keyword_matcher.counts(combined_text, matched_keywords)
         
         # Determine Impact
         impact = "Low"
-        if any(word in combined_text for word in ["critical", "production", "outage", "down", "all users", "entire"]):
+        if match_counts["impact:High"]:
             impact = "High"
-        elif any(word in combined_text for word in ["multiple", "several", "department", "important", "affecting"]):
+        elif match_counts["impact:Medium"]:
             impact = "Medium"
         
         # Determine Urgency
         urgency = "Low"
-        if any(word in combined_text for word in ["urgent", "asap", "immediately", "emergency", "critical", "cannot work"]):
+        if match_counts["urgency:High"]:
             urgency = "High"
-        elif any(word in combined_text for word in ["soon", "today", "need", "important", "affecting work"]):
+        elif match_counts["urgency:Medium"]:
             urgency = "Medium"
         
+        # Priority, confidence and reasoning depend only on (impact, urgency): precomputed at startup
+        return self._priority_table[impact][urgency]
+    
+    def _priority_result(self, impact, urgency):
+        """Priority prediction for one impact × urgency cell"""
+        
         # Calculate Priority
         priority = PRIORITY_MATRIX.get((impact, urgency), "Low")
         
@@ -162,63 +288,95 @@ class TicketPredictor:
             "reasoning": f"Impact={impact} (based on scope), Urgency={urgency} (based on time sensitivity)"
         }
     
-    def predict_resolver(self, title, description, category, impact, urgency):
-        """Predict resolver group using the trained resolver model"""
-        combined_text = f"{title} {description}"
+    def _vectorize(self, combined_text):
+        """TF-IDF transform of normalized ticket text (cached for the resolver)"""
+        return self.tfidf.transform([combined_text])
+    
+    def predict_resolver(self, title, description, category, impact, urgency, keyword_shortcut=False,
+                         category_confidence=None, normalized_text=None, keyword_features=None):
+        """
+        Predict resolver group using the trained resolver model.
+        keyword_features: the category stage's keyword_matches as (feature, flag) pairs, reused instead of a rescan.
+        """
+        return _thaw(self._cached["resolver"](
+            normalized_text or normalize_text(title, description), category, impact, urgency, keyword_shortcut,
+            category_confidence, keyword_features
+        ))
+    
+    def _predict_resolver(self, combined_text, category, impact, urgency, keyword_shortcut, category_confidence,
+                          keyword_features):
+        """Resolver prediction for normalized ticket text (cached by predict_resolver)"""
+        # Keyword prescreen: a clearly dominant category routes deterministically, skipping TF-IDF + forest
+        if keyword_shortcut and category in CATEGORY_RESOLVER_MAP:
+            resolver = CATEGORY_RESOLVER_MAP[category]
+            confidence = category_confidence if category_confidence is not None else 0.95
+            # No resolver model ran, so the confidence is the category's and source says so
+            return {
+                "resolver_group": resolver,
+                "confidence": confidence,
+                "source": "keyword_map",
+                "reasoning": f"Keyword prescreen: {category} clearly dominates, routed to {resolver} via category mapping ({confidence:.1%} category confidence, no resolver model run)"
+            }
         
         # TF-IDF features
-        tfidf_features = self.tfidf.transform([combined_text])
+        tfidf_features = self._cached["tfidf"](combined_text)
         
         # Keyword features (in exact order from training)
-        keyword_dict = self.extract_keywords(combined_text)
-        keyword_features = np.array([
-            keyword_dict['has_network_keyword'],
-            keyword_dict['has_hardware_keyword'],
-            keyword_dict['has_database_keyword'],
-            keyword_dict['has_cloud_keyword'],
-            keyword_dict['has_security_keyword'],
-            keyword_dict['has_devops_keyword'],
-            keyword_dict['has_email_keyword']
-        ]).reshape(1, -1)
-        
-        # Encode categorical features (including affected_users)
-        category_encoded = self.category_encoder.transform([category]).reshape(1, -1)
-        impact_encoded = self.impact_encoder.transform([impact]).reshape(1, -1)
-        urgency_encoded = self.urgency_encoder.transform([urgency]).reshape(1, -1)
-        affected_users = np.array([[1]])  # Default to 1 user affected
-        
-        # Combine all features in the same order as training:
+        keyword_dict = dict(keyword_features) if keyword_features is not None else self.extract_keywords(combined_text)
+        
+        # Encoded categorical features + affected_users (default 1) + keywords, in training order:
         # [TF-IDF, category, impact, urgency, affected_users, keywords]
-        combined_features = hstack([
-            tfidf_features,
-            csr_matrix(category_encoded),
-            csr_matrix(impact_encoded),
-            csr_matrix(urgency_encoded),
-            csr_matrix(affected_users),
-            csr_matrix(keyword_features)
-        ])
-        
-        # Predict resolver
-        resolver = self.resolver_model.predict(combined_features)[0]
+        extras = np.array([
+            self._category_codes[category],
+            self._impact_codes[impact],
+            self._urgency_codes[urgency],
+            1,
+            *(keyword_dict[feature] for feature in TRAINING_KEYWORD_FEATURES)
+        ], dtype=np.float64)
+        
+        # Append the non-zero extras to the TF-IDF row as a single CSR row, instead of hstacking six blocks
+        n_tfidf = tfidf_features.shape[1]
+        nonzero = np.flatnonzero(extras)
+        data = np.concatenate([tfidf_features.data, extras[nonzero]])
+        indices = np.concatenate([tfidf_features.indices, n_tfidf + nonzero])
+        combined_features = csr_matrix(
+            (data, indices, np.array([0, len(data)])),
+            shape=(1, n_tfidf + len(extras))
+        )
+        
+        # Predict resolver: one forest pass; predict() is the argmax of these same probabilities
         probabilities = self.resolver_model.predict_proba(combined_features)[0]
-        
-        # Get confidence for the predicted resolver
-        resolver_classes = self.resolver_model.classes_
-        resolver_idx = np.where(resolver_classes == resolver)[0][0]
+        resolver_idx = int(np.argmax(probabilities))
+        resolver = self.resolver_model.classes_[resolver_idx]
         confidence = float(probabilities[resolver_idx])
         
         return {
             "resolver_group": resolver,
             "confidence": confidence,
+            "source": "model",
             "reasoning": f"ML model predicted {resolver} with {confidence:.1%} confidence based on category={category}, impact={impact}, urgency={urgency}"
         }
     
-    def find_duplicates(self, title, description, historical_tickets=None):
-        """Find duplicate/similar tickets using Sentence-BERT"""
-        current_text = f"{title} {description}"
-        current_embedding = self.sentence_bert.encode([current_text])
+    def load_history(self, historical_tickets):
+        """Use startup-configured ticket history when requests don't send one, embedding it once up front"""
+        self.default_history = TicketStore.from_records(historical_tickets, HISTORY_TEXT_FIELDS)
+        if self.default_history:
+            self._get_history_index(self.default_history)
+    
+    def _get_history_index(self, store):
+        """Search index for a ticket store (embeddings cached across requests, startup history kept on disk)"""
+        return self._history_cache.get_index(
+            self.sentence_bert, store.texts, persist=store is self.default_history, key=store.fingerprint
+        )
+    
+    def find_duplicates(self, title, description, historical_tickets=None, query_vec=None, combined_text=None):
+        """Find duplicate/similar tickets using Sentence-BERT (query_vec skips re-encoding the ticket)"""
+        if historical_tickets is None and self.default_history is not None:
+            store = self.default_history
+        else:
+            store = TicketStore.from_records(historical_tickets, HISTORY_TEXT_FIELDS)
         
-        if historical_tickets is None or len(historical_tickets) == 0:
+        if len(store) == 0:
             # No historical data - return empty
             return {
                 "has_duplicates": False,
@@ -227,38 +385,44 @@ class TicketPredictor:
                 "reasoning": "No historical tickets available for comparison"
             }
         
-        # Get embeddings for historical tickets
-        historical_texts = [
-            f"{t.get('title', '')} {t.get('description', '')}" 
-            for t in historical_tickets
-        ]
-        historical_embeddings = self.sentence_bert.encode(historical_texts)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(current_embedding, historical_embeddings)[0]
+        if combined_text is None:
+            combined_text = f"{title} {description}"
+        if query_vec is None:
+            query_vec = self.embedding_cache.encode_query(self.sentence_bert, combined_text)[0]
+        
+        historical_tickets = store.records
+        if FAST_RETRIEVAL and len(store) > FAST_RETRIEVAL_CANDIDATES:
+            # TF-IDF shortlist, then Sentence-BERT cosine on the shortlist only
+            top_indices, top_similarities, scanned = self._prefilter.search(
+                self.sentence_bert, store, combined_text, query_vec, DUPLICATE_MAX_RESULTS
+            )
+        else:
+            # Cosine similarity via one normalized matmul (HNSW / cluster shortlist only for a large startup history)
+            historical_index = self._get_history_index(store)
+            top_indices, top_similarities, scanned = historical_index.search(
+                query_vec, DUPLICATE_MAX_RESULTS, widen_above=DUPLICATE_SIMILARITY_THRESHOLD
+            )
         
         # Find duplicates above threshold
-        duplicate_indices = np.where(similarities >= DUPLICATE_SIMILARITY_THRESHOLD)[0]
+        duplicate_count = int(np.count_nonzero(scanned >= DUPLICATE_SIMILARITY_THRESHOLD))
         
-        # Get top similar tickets
-        top_indices = np.argsort(similarities)[-5:][::-1]
         similar_tickets = [
             {
                 "ticket_id": historical_tickets[idx].get('ticket_id', f'TICKET-{idx}'),
                 "title": historical_tickets[idx].get('title', ''),
-                "similarity": float(similarities[idx]),
+                "similarity": float(similarity),
                 "status": historical_tickets[idx].get('status', 'Unknown'),
                 "resolution": historical_tickets[idx].get('resolution', '')
             }
-            for idx in top_indices
-            if similarities[idx] > 0.5  # Only show >50% similar
+            for idx, similarity in zip(top_indices, top_similarities)
+            if similarity > 0.5  # Only show >50% similar
         ]
         
         return {
-            "has_duplicates": len(duplicate_indices) > 0,
+            "has_duplicates": duplicate_count > 0,
             "similar_tickets": similar_tickets,
-            "duplicate_count": len(duplicate_indices),
-            "reasoning": f"Found {len(duplicate_indices)} tickets with >{DUPLICATE_SIMILARITY_THRESHOLD*100}% similarity"
+            "duplicate_count": duplicate_count,
+            "reasoning": f"Found {duplicate_count} tickets with >{DUPLICATE_SIMILARITY_THRESHOLD*100}% similarity"
         }
     
     def _get_feature_importance(self, tfidf_features, predicted_class_idx):
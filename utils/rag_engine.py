@@ -2,20 +2,58 @@
 RAG Engine - Knowledge Base Search and Auto-Response Generation
 """
 
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from config.settings import KB_TOP_K, KB_MIN_SIMILARITY, RESPONSE_TEMPLATES, CATEGORY_KEYWORDS
+from config.settings import (
+    KB_TOP_K, KB_MIN_SIMILARITY, RESPONSE_TEMPLATES, CATEGORY_KEYWORDS, FAST_RETRIEVAL, FAST_RETRIEVAL_CANDIDATES
+)
+from utils.embedding_cache import EmbeddingCache, CorpusCache
+from utils.ticket_store import TicketStore
+from utils.lexical_prefilter import LexicalPrefilter
+
+# Article fields embedded for KB search
+KB_TEXT_FIELDS = ('title', 'solution')
+
+# Fallback for categories without their own template
+DEFAULT_TEMPLATE = RESPONSE_TEMPLATES["Software"]
 
 class RAGEngine:
-    def __init__(self, sentence_bert):
+    def __init__(self, sentence_bert, embedding_cache=None, tfidf=None):
         self.sentence_bert = sentence_bert
+        self.embedding_cache = embedding_cache or EmbeddingCache()
         
-    def search_knowledge_base(self, title, description, category, knowledge_base=None):
-        """Search knowledge base for similar issues and solutions"""
-        current_text = f"{title} {description}"
-        current_embedding = self.sentence_bert.encode([current_text])
+        # TF-IDF first stage for FAST_RETRIEVAL (needs the fitted vectorizer)
+        self._prefilter = LexicalPrefilter(tfidf, self.embedding_cache) if tfidf is not None else None
+        
+        # KB search indexes keyed by content hash (requests usually resend the same KB); a large startup KB gets an ANN shortlist
+        self._kb_cache = CorpusCache(self.embedding_cache, cluster=True, name="kb")
+        self.default_knowledge_base = None
+    
+    def load_knowledge_base(self, knowledge_base):
+        """Use a startup-configured KB when requests don't send one, embedding it once up front"""
+        self.default_knowledge_base = TicketStore.from_records(knowledge_base, KB_TEXT_FIELDS)
+        if self.default_knowledge_base:
+            self._get_kb_index(self.default_knowledge_base)
+    
+    def _get_kb_index(self, store):
+        """Search index for a KB store (embeddings cached across requests, startup KB kept on disk)"""
+        return self._kb_cache.get_index(
+            self.sentence_bert, store.texts, persist=store is self.default_knowledge_base, key=store.fingerprint
+        )
+        
+    def encode_query(self, title, description, combined_text=None):
+        """L2-normalized Sentence-BERT vector for a ticket, shared by KB search and duplicate detection"""
+        if combined_text is None:
+            combined_text = f"{title} {description}"
+        return self.embedding_cache.encode_query(self.sentence_bert, combined_text)[0]
+    
+    def search_knowledge_base(self, title, description, category, knowledge_base=None, query_vec=None,
+                              combined_text=None):
+        """Search knowledge base for similar issues and solutions (query_vec skips re-encoding the ticket)"""
+        if knowledge_base is None and self.default_knowledge_base is not None:
+            store = self.default_knowledge_base
+        else:
+            store = TicketStore.from_records(knowledge_base, KB_TEXT_FIELDS)
         
-        if knowledge_base is None or len(knowledge_base) == 0:
+        if len(store) == 0:
             # Return category-based generic solution
             return {
                 "kb_articles": [],
@@ -23,28 +61,31 @@ class RAGEngine:
                 "reasoning": "No knowledge base available - using template-based response"
             }
         
-        # Get embeddings for KB articles
-        kb_texts = [
-            f"{article.get('title', '')} {article.get('solution', '')}" 
-            for article in knowledge_base
-        ]
-        kb_embeddings = self.sentence_bert.encode(kb_texts)
-        
-        # Calculate similarities
-        similarities = cosine_similarity(current_embedding, kb_embeddings)[0]
-        
-        # Find top K articles above minimum similarity
-        top_indices = np.argsort(similarities)[-KB_TOP_K:][::-1]
+        if combined_text is None:
+            combined_text = f"{title} {description}"
+        if query_vec is None:
+            query_vec = self.encode_query(title, description, combined_text)
+        
+        knowledge_base = store.records
+        if FAST_RETRIEVAL and self._prefilter is not None and len(store) > FAST_RETRIEVAL_CANDIDATES:
+            # TF-IDF shortlist, then Sentence-BERT cosine on the shortlist only
+            top_indices, top_similarities, _ = self._prefilter.search(
+                self.sentence_bert, store, combined_text, query_vec, KB_TOP_K
+            )
+        else:
+            # Cosine similarity via one normalized matmul, then top K articles above minimum similarity
+            kb_index = self._get_kb_index(store)
+            top_indices, top_similarities, _ = kb_index.search(query_vec, KB_TOP_K)
         kb_articles = [
             {
                 "article_id": knowledge_base[idx].get('article_id', f'KB-{idx}'),
                 "title": knowledge_base[idx].get('title', ''),
                 "solution": knowledge_base[idx].get('solution', ''),
-                "similarity": float(similarities[idx]),
+                "similarity": float(similarity),
                 "category": knowledge_base[idx].get('category', '')
             }
-            for idx in top_indices
-            if similarities[idx] >= KB_MIN_SIMILARITY
+            for idx, similarity in zip(top_indices, top_similarities)
+            if similarity >= KB_MIN_SIMILARITY
         ]
         
         return {
@@ -56,21 +97,16 @@ class RAGEngine:
     def generate_auto_response(self, category, title, description, kb_articles=None):
         """Generate auto-draft response based on category and KB"""
         # Get category-specific template
-        template = RESPONSE_TEMPLATES.get(category, RESPONSE_TEMPLATES["Software"])
+        template = RESPONSE_TEMPLATES.get(category, DEFAULT_TEMPLATE)
         
-        # If KB articles exist, incorporate their solutions
-        if kb_articles and len(kb_articles) > 0:
-            kb_solutions = "\n\n**Related Solutions from Knowledge Base:**\n"
+        # Ticket-specific context, template, then any KB solutions, joined once
+        parts = [f"**Ticket:** {title}\n\n", template]
+        if kb_articles:
+            parts.append("\n\n\n**Related Solutions from Knowledge Base:**\n")
             for i, article in enumerate(kb_articles[:3], 1):
-                kb_solutions += f"\n{i}. **{article['title']}** ({article['similarity']*100:.0f}% match)\n"
-                kb_solutions += f"   {article['solution'][:200]}...\n"
-            
-            response = f"{template}\n{kb_solutions}"
-        else:
-            response = template
-        
-        # Add ticket-specific context
-        response = f"**Ticket:** {title}\n\n{response}"
+                parts.append(f"\n{i}. **{article['title']}** ({article['similarity']*100:.0f}% match)\n")
+                parts.append(f"   {article['solution'][:200]}...\n")
+        response = "".join(parts)
         
         return {
             "auto_response": response,
@@ -0,0 +1,48 @@
+"""
+Repack Models - One-shot re-save of the model artifacts in a layout ModelLoader can memory-map
+
+Usage: python -m utils.repack_models <models_dir>
+"""
+
+import argparse
+import os
+import pickle
+import time
+from pathlib import Path
+import joblib
+from config.settings import MODEL_FILES
+
+def repack(path):
+    """Re-dump one artifact uncompressed with the newest pickle protocol (replaces the file atomically)"""
+    start = time.perf_counter()
+    try:
+        model = joblib.load(path)
+    except Exception:
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+
+    # Uncompressed joblib stores numpy arrays as raw aligned buffers, which mmap_mode='r' maps without copying
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    joblib.dump(model, tmp_path, compress=0, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    print(f"✅ Repacked {path.name} ({path.stat().st_size / 1e6:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-save model artifacts for memory-mapped loading")
+    parser.add_argument("models_dir", help="Directory holding the .pkl model files (e.g. ../models_improved)")
+    args = parser.parse_args()
+
+    models_dir = Path(args.models_dir)
+    for model_file in MODEL_FILES:
+        path = models_dir / model_file
+        if not path.exists():
+            print(f"⚠️ File not found: {model_file}")
+            continue
+        if path.is_symlink():
+            # HuggingFace cache entries point into the shared blob store; don't rewrite those in place
+            print(f"⚠️ Skipping symlink (copy the file out of the HuggingFace cache first): {model_file}")
+            continue
+        repack(path)
+
+if __name__ == "__main__":
+    main()
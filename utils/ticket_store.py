@@ -0,0 +1,22 @@
+"""
+Ticket Store - A ticket / KB article list with its embedded texts and content key, built once per corpus
+"""
+
+from dataclasses import dataclass
+from utils.embedding_cache import corpus_fingerprint
+
+@dataclass(frozen=True)
+class TicketStore:
+    records: list  # Original ticket / article dicts, indexed by search results
+    texts: list  # Text embedded for each record
+    fingerprint: bytes  # Content key of texts for the corpus caches
+
+    @classmethod
+    def from_records(cls, records, text_fields):
+        """Join the given fields of every record (space separated) and fingerprint the result"""
+        records = list(records or [])
+        texts = [" ".join(f"{record.get(field, '')}" for field in text_fields) for record in records]
+        return cls(records, texts, corpus_fingerprint(texts))
+
+    def __len__(self):
+        return len(self.records)
@@ -0,0 +1,156 @@
+"""
+Vector Index - Cosine-similarity search over a cached embedding matrix
+"""
+
+import math
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from config.settings import (
+    CLUSTER_MIN_ITEMS, CLUSTER_PROBES, EMBEDDING_STORAGE_DTYPE, ANN_BACKEND, HNSW_M, HNSW_EF_CONSTRUCTION,
+    HNSW_CANDIDATES
+)
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib is optional (source-only on PyPI, not in requirements.txt); large corpora then use k-means
+    hnswlib = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional (not in requirements.txt); it only speeds up int8 and float32-subset scoring
+    njit = None
+
+# Rows upcast to float32 per step when scoring half-precision storage (keeps the temporary cache-sized)
+_SCORE_BLOCK = 4096
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dot_rows(matrix, query, rows):
+        """Dot products of query with matrix[rows], reading rows in place instead of copying them out"""
+        out = np.empty(rows.shape[0], dtype=np.float32)
+        for i in prange(rows.shape[0]):
+            row = rows[i]
+            acc = np.float32(0.0)
+            for j in range(matrix.shape[1]):
+                acc += np.float32(matrix[row, j]) * query[j]
+            out[i] = acc
+        return out
+else:
+    _dot_rows = None
+
+def normalize_rows(embeddings):
+    """Return a contiguous float32 copy of embeddings with L2-normalized rows"""
+    embeddings = np.array(embeddings, dtype=np.float32, order='C', ndmin=2)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings /= np.clip(norms, 1e-12, None)
+    return embeddings
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first (O(N) selection instead of a full sort)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    # Partition the scores in place of a negated copy; only the k winners get sorted
+    idx = np.argpartition(scores, len(scores) - k)[-k:]
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+class VectorIndex:
+    def __init__(self, embeddings, cluster=False, dtype=EMBEDDING_STORAGE_DTYPE):
+        # Rows are normalized once at insertion, so cosine similarity is a single matrix-vector product
+        self.embeddings = normalize_rows(embeddings)
+        self.centroids = None
+        self.members = None
+        self.graph = None
+
+        # Large corpora get an approximate shortlist (HNSW graph, or the nearest k-means clusters)
+        if cluster and len(self) >= CLUSTER_MIN_ITEMS:
+            if ANN_BACKEND == "hnsw" and hnswlib is not None:
+                self._build_graph()
+            else:
+                self._build_clusters()
+
+        # Search is memory-bandwidth bound: float16 storage halves the bytes streamed per query, int8 quarters them
+        self.scale = None
+        if np.dtype(dtype) == np.int8:
+            # Symmetric per-matrix quantization; the scale is folded into the query at search time
+            self.scale = max(float(np.abs(self.embeddings).max()), 1e-12) / 127
+            self.embeddings = np.round(self.embeddings / self.scale).astype(np.int8)
+        else:
+            self.embeddings = self.embeddings.astype(dtype, copy=False)
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def _build_clusters(self):
+        """Cluster the rows with k-means so queries can skip far-away groups"""
+        n_clusters = max(8, int(math.sqrt(len(self))))
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=1024, n_init=3, random_state=0)
+        labels = kmeans.fit_predict(self.embeddings)
+        self.centroids = normalize_rows(kmeans.cluster_centers_)
+        self.members = [np.flatnonzero(labels == c) for c in range(n_clusters)]
+
+    def _build_graph(self):
+        """Index the rows in an HNSW graph (inner product on normalized rows is cosine similarity)"""
+        graph = hnswlib.Index(space='ip', dim=self.embeddings.shape[1])
+        graph.init_index(max_elements=len(self), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        # Requests already run in parallel threads, so building and querying stay single-threaded
+        graph.set_num_threads(1)
+        graph.add_items(self.embeddings, np.arange(len(self)))
+        graph.set_ef(max(HNSW_CANDIDATES, 2 * HNSW_M))
+        self.graph = graph
+
+    def _candidates(self, query, widen_above=None):
+        """Row indices worth scanning for this query (None means all rows)"""
+        if self.graph is not None:
+            # Keep doubling the neighbour count while even the farthest one clears widen_above, so callers
+            # counting rows above a threshold aren't capped at HNSW_CANDIDATES (e.g. an outage storm)
+            k = min(HNSW_CANDIDATES, len(self))
+            while True:
+                labels, distances = self.graph.knn_query(query, k=k)
+                if widen_above is None or k == len(self) or 1 - distances[0][-1] < widen_above:
+                    return labels[0].astype(np.intp)
+                k = min(2 * k, len(self))
+        if self.centroids is None:
+            return None
+        nearest = top_k_indices(self.centroids @ query, CLUSTER_PROBES)
+        return np.concatenate([self.members[c] for c in nearest])
+
+    def _similarities(self, query, rows=None):
+        """Dot products of query with the stored rows (all rows, or the given row indices)"""
+        if self.scale is not None:
+            query = query * np.float32(self.scale)
+
+        # Full float32 scans stay on BLAS; probed float32 subsets and int8 rows are scored in place by Numba
+        if _dot_rows is not None:
+            if self.embeddings.dtype == np.int8:
+                return _dot_rows(self.embeddings, query, np.arange(len(self)) if rows is None else rows)
+            if rows is not None and self.embeddings.dtype == np.float32:
+                return _dot_rows(self.embeddings, query, rows)
+
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        if matrix.dtype == np.float32:
+            return matrix @ query
+
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _SCORE_BLOCK):
+            scores[start:start + _SCORE_BLOCK] = matrix[start:start + _SCORE_BLOCK].astype(np.float32) @ query
+        return scores
+
+    def search(self, query, k, widen_above=None):
+        """
+        Return (top-k indices best first, their similarities, similarities of every scanned row).
+        Without a shortlist (graph or clusters) every row is scanned, so the last value covers the whole corpus.
+        With the HNSW graph, every row at or above widen_above is scanned (up to graph recall); the k-means
+        shortlist only scans the probed clusters.
+        """
+        query = normalize_rows(query)[0]
+        candidates = self._candidates(query, widen_above)
+
+        if candidates is None:
+            scanned = self._similarities(query)
+            top = top_k_indices(scanned, k)
+            return top, scanned[top], scanned
+
+        scanned = self._similarities(query, candidates)
+        top = top_k_indices(scanned, k)
+        return candidates[top], scanned[top], scanned